@@ -19,17 +19,14 @@ with TelegramClient('session_name', api_id, api_hash) as client:
     
     for dialog in client.iter_dialogs():
         # Only show channels where you are admin
-        if hasattr(dialog.entity, 'broadcast') and dialog.entity.broadcast:
+        if dialog.is_channel and dialog.entity.broadcast:
             print(f"\n📢 Name: {dialog.name}")
             print(f"   ID: {dialog.id}")
             print(f"   Type: Channel")
             
             # Check if you're admin
-            try:
-                if dialog.entity.creator or (hasattr(dialog.entity, 'admin_rights') and dialog.entity.admin_rights):
-                    print(f"   ✅ You are ADMIN/CREATOR")
-            except:
-                pass
+            if dialog.entity.creator or dialog.entity.admin_rights:
+                print(f"   ✅ You are ADMIN/CREATOR")
             
             print("-" * 70)
 
@@ -1,16 +1,26 @@
 import os
-import re
+import time
 import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from telethon import TelegramClient, events
 from pybit.unified_trading import HTTP
+from pybit.exceptions import InvalidRequestError
 from decimal import Decimal, ROUND_DOWN
+from signal_parser import parse_signal_message
 
 # ---------------------------------
 # Load ENV Variables
 # ---------------------------------
 load_dotenv()
 
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(message)s",
+)
+log = logging.getLogger("bot")
+
 TG_API_ID = int(os.getenv("TG_API_ID"))
 TG_API_HASH = os.getenv("TG_API_HASH")
 TG_CHANNEL = int(os.getenv("TG_CHANNEL"))
@@ -21,12 +31,64 @@ BYBIT_API_SECRET = os.getenv("BYBIT_API_SECRET")
 USE_TESTNET = os.getenv("USE_TESTNET", "false").lower() == "true"
 
 TRADE_PERCENT = float(os.getenv("TRADE_PERCENT", 0.10))  # fraction of balance to trade (0.10 = 10%)
+_TRADE_PERCENT_D = Decimal(str(TRADE_PERCENT))
 DEFAULT_LEVERAGE = int(os.getenv("DEFAULT_LEVERAGE", 20))
 TRADE_CATEGORY = "linear"
+CLOSE_SIDE = {"Buy": "Sell", "Sell": "Buy"}  # order side that closes a position
+CROSS_TRADE_MODE = 0
+
+# Bybit retCodes meaning "already configured that way"
+MARGIN_NOT_MODIFIED = 110026
+LEVERAGE_NOT_MODIFIED = 110043
 
 # Safety / minimums
 MIN_QTY = Decimal("0.000001")
 QTY_DECIMALS = 6
+_QTY_QUANT = Decimal("1").scaleb(-QTY_DECIMALS)
+_TP_PRICE_QUANT = Decimal("1e-8")
+
+# Short-lived balance cache (absorbs bursts of signals). Prices are never
+# cached: the market order is sized from them, so they must be fresh.
+QUOTE_CACHE_TTL = float(os.getenv("QUOTE_CACHE_TTL", 2.0))  # seconds
+_balance_cache = None  # (balance, expires_at)
+_symbol_config = {}  # symbol -> (trade_mode, leverage) confirmed on Bybit
+
+# pybit is blocking: its calls run in worker threads, at most this many at once
+MAX_CONCURRENT_REQUESTS = 4
+_bybit_sem = None  # asyncio.Semaphore, created in main() on the running loop
+_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="bybit")
+BYBIT_KEEPALIVE_INTERVAL = 60  # seconds between pings that keep the HTTPS connection open
+
+# ---------------------------------
+# Rate Limiting
+# ---------------------------------
+class TokenBucket:
+    # Refills `rate` tokens per second up to `capacity`; acquire() waits for one.
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self._lock = None  # created on first use, on the running loop
+
+    async def acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# Stay under Bybit's per-account limits locally instead of getting rejected
+_order_bucket = TokenBucket(rate=10, capacity=20)  # order placement
+_read_bucket = TokenBucket(rate=50, capacity=100)  # everything else
+
 
 # ---------------------------------
 # Bybit API Initialization
@@ -40,79 +102,144 @@ session = HTTP(
 # ---------------------------------
 # Helper Functions
 # ---------------------------------
-def safe_decimal(v, quantize_decimals=6):
-    d = Decimal(str(v))
-    q = Decimal("1").scaleb(-quantize_decimals)
+def to_decimal(v):
+    return v if isinstance(v, Decimal) else Decimal(str(v))
+
+
+def safe_decimal(v, quantize_decimals=QTY_DECIMALS):
+    d = to_decimal(v)
+    q = _QTY_QUANT if quantize_decimals == QTY_DECIMALS else Decimal("1").scaleb(-quantize_decimals)
     return d.quantize(q, rounding=ROUND_DOWN)
 
 
-def get_balance():
+async def _call(bucket: TokenBucket, fn, *args, **kwargs):
+    await bucket.acquire()
+    async with _bybit_sem:
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+
+async def get_balance():
+    global _balance_cache
+    now = time.monotonic()
+    if _balance_cache and now < _balance_cache[1]:
+        return _balance_cache[0]
+
     try:
-        res = session.get_wallet_balance(accountType="UNIFIED")
+        res = await _call(_read_bucket, session.get_wallet_balance, accountType="UNIFIED")
         if "result" in res and "list" in res["result"] and len(res["result"]["list"]) > 0:
-            total_equity = res["result"]["list"][0].get("totalEquity")
-            return float(total_equity)
+            total_equity = Decimal(res["result"]["list"][0].get("totalEquity"))
+            _balance_cache = (total_equity, now + QUOTE_CACHE_TTL)
+            return total_equity
         else:
-            print("❌ Unexpected balance response:", res)
-            return 0.0
+            log.error("❌ Unexpected balance response: %s", res)
+            return Decimal("0")
     except Exception as e:
-        print("❌ Error fetching balance:", e)
-        return 0.0
+        log.error("❌ Error fetching balance: %s", e)
+        return Decimal("0")
 
 
-def set_cross_margin(symbol: str):
+async def set_cross_margin(symbol: str):
     try:
-        session.switch_margin_mode(
+        await _call(
+            _read_bucket,
+            session.switch_margin_mode,
             category=TRADE_CATEGORY,
             symbol=symbol,
-            tradeMode=0
+            tradeMode=CROSS_TRADE_MODE
         )
-        print(f"✅ Cross margin set for {symbol}")
+        log.info("✅ Cross margin set for %s", symbol)
+        return True
+    except InvalidRequestError as e:
+        if e.status_code == MARGIN_NOT_MODIFIED:
+            return True
+        log.warning("⚠️ Failed to set cross margin (continuing): %s", e)
+        return False
     except Exception as e:
-        print("⚠️ Failed to set cross margin (continuing):", e)
+        log.warning("⚠️ Failed to set cross margin (continuing): %s", e)
+        return False
 
 
-def set_leverage(symbol: str, leverage: int):
+async def set_leverage(symbol: str, leverage: int):
     try:
-        session.set_leverage(
+        await _call(
+            _read_bucket,
+            session.set_leverage,
             category=TRADE_CATEGORY,
             symbol=symbol,
             buyLeverage=leverage,
             sellLeverage=leverage
         )
-        print(f"✅ Leverage set to {leverage}x for {symbol}")
+        log.info("✅ Leverage set to %sx for %s", leverage, symbol)
+        return True
+    except InvalidRequestError as e:
+        if e.status_code == LEVERAGE_NOT_MODIFIED:
+            return True
+        log.warning("⚠️ Failed to set leverage (continuing): %s", e)
+        return False
     except Exception as e:
-        print("⚠️ Failed to set leverage (continuing):", e)
+        log.warning("⚠️ Failed to set leverage (continuing): %s", e)
+        return False
 
 
-def get_market_price(symbol: str):
+async def get_position_config(symbol: str):
     try:
-        ticker = session.get_tickers(category=TRADE_CATEGORY, symbol=symbol)
-        price = float(ticker["result"]["list"][0]["lastPrice"])
+        res = await _call(_read_bucket, session.get_positions, category=TRADE_CATEGORY, symbol=symbol)
+        positions = res["result"]["list"]
+        # Hedge mode returns one entry per side, and each side has its own
+        # leverage; only report a value when every entry agrees on it
+        trade_modes = {int(p["tradeMode"]) for p in positions}
+        leverages = {Decimal(p["leverage"]) for p in positions}
+        trade_mode = trade_modes.pop() if len(trade_modes) == 1 else None
+        leverage = leverages.pop() if len(leverages) == 1 else None
+        return trade_mode, leverage
+    except Exception as e:
+        log.warning("⚠️ Could not read position config for %s: %s", symbol, e)
+        return None, None
+
+
+async def ensure_symbol_config(symbol: str, leverage: int):
+    # Margin mode and leverage stick on Bybit, so only set them once per symbol,
+    # and only the ones the current position settings don't already match
+    if _symbol_config.get(symbol) == (CROSS_TRADE_MODE, leverage):
+        return
+    trade_mode, current_leverage = await get_position_config(symbol)
+    updates = []
+    if trade_mode != CROSS_TRADE_MODE:
+        updates.append(set_cross_margin(symbol))
+    if current_leverage != leverage:
+        updates.append(set_leverage(symbol, leverage))
+    if all(await asyncio.gather(*updates)):
+        _symbol_config[symbol] = (CROSS_TRADE_MODE, leverage)
+
+
+async def get_market_price(symbol: str):
+    try:
+        ticker = await _call(_read_bucket, session.get_tickers, category=TRADE_CATEGORY, symbol=symbol)
+        price = Decimal(ticker["result"]["list"][0]["lastPrice"])
         return price
     except Exception as e:
-        print("❌ Error fetching price for", symbol, ":", e)
+        log.error("❌ Error fetching price for %s: %s", symbol, e)
         return None
 
 
-def calculate_order_qty(balance: float, percent: float, price: float):
+def calculate_order_qty(balance: Decimal, percent: Decimal, price: Decimal):
     if price <= 0 or balance <= 0 or percent <= 0:
         return Decimal("0")
-    trade_value = Decimal(str(balance)) * Decimal(str(percent))
-    qty = trade_value / Decimal(str(price))
-    qty = safe_decimal(qty, QTY_DECIMALS)
+    qty = safe_decimal(balance * percent / price)
     if qty < MIN_QTY:
         qty = MIN_QTY
     return qty
 
 
-def place_market_order(symbol: str, side: str, qty: Decimal):
+async def place_market_order(symbol: str, side: str, qty: Decimal):
     try:
         if qty <= 0:
-            print(f"⚠️ Invalid quantity: {qty}")
+            log.warning("⚠️ Invalid quantity: %s", qty)
             return None
 
-        resp = session.place_order(
+        resp = await _call(
+            _order_bucket,
+            session.place_order,
             category=TRADE_CATEGORY,
             symbol=symbol,
             side=side,
@@ -121,18 +248,20 @@ def place_market_order(symbol: str, side: str, qty: Decimal):
             timeInForce="GTC",
             reduceOnly=False
         )
-        print(f"✅ Market order placed: {side} {qty} {symbol}")
-        print(f"   Response: {resp}")
+        log.info("✅ Market order placed: %s %s %s", side, qty, symbol)
+        log.debug("Order response: %s", resp)
         return resp
     except Exception as e:
-        print("❌ Failed to place market order:", e)
+        log.error("❌ Failed to place market order: %s", e)
         return None
 
 
-def place_reduce_only_tp(symbol: str, take_profit_price: Decimal, side: str, qty: Decimal):
+async def place_reduce_only_tp(symbol: str, take_profit_price: Decimal, side: str, qty: Decimal):
     try:
-        tp_side = "Buy" if side.lower() == "sell" else "Sell"
-        resp = session.place_order(
+        tp_side = CLOSE_SIDE[side]
+        resp = await _call(
+            _order_bucket,
+            session.place_order,
             category=TRADE_CATEGORY,
             symbol=symbol,
             side=tp_side,
@@ -142,159 +271,205 @@ def place_reduce_only_tp(symbol: str, take_profit_price: Decimal, side: str, qty
             timeInForce="GTC",
             reduceOnly=True
         )
-        print(f"✅ TP order placed: {tp_side} {qty} {symbol} @ {take_profit_price}")
-        print(f"   Response: {resp}")
+        log.info("✅ TP order placed: %s %s %s @ %s", tp_side, qty, symbol, take_profit_price)
+        log.debug("Order response: %s", resp)
         return resp
     except Exception as e:
-        print("❌ Failed to place TP order:", e)
+        log.error("❌ Failed to place TP order: %s", e)
         return None
 
 
-def parse_signal_message(msg: str):
-    if re.search(r"Price\s*-\s*\d+(\.\d+)?\s*\n.*Profit", msg, re.IGNORECASE):
-        print("ℹ️ Ignoring compact price/profit message.")
-        return None
-
-    if re.search(r"\b(long|buy)\b", msg, re.IGNORECASE):
-        side = "Buy"
-    elif re.search(r"\b(short|sell)\b", msg, re.IGNORECASE):
-        side = "Sell"
-    else:
-        print("⚠️ No valid signal side found.")
-        return None
-
-    sym_match = re.search(r"#?([A-Z0-9]+)[\-/]?USDT", msg.upper())
-    if not sym_match:
-        print("⚠️ No valid symbol found.")
-        return None
-    symbol = f"{sym_match.group(1).upper()}USDT"
+async def ping_bybit():
+    try:
+        await _call(_read_bucket, session.get_server_time)
+        return True
+    except Exception as e:
+        log.warning("⚠️ Bybit ping failed: %s", e)
+        return False
 
-    entry_match = re.search(r"Entry\s*-\s*([0-9]*\.?[0-9]+)", msg, re.IGNORECASE)
-    entry_price = float(entry_match.group(1)) if entry_match else None
 
-    tps = []
-    if re.search(r"Take-?Profit", msg, re.IGNORECASE):
-        all_numbers = re.findall(r"([0-9]*\.?[0-9]+)", msg)
-        for n in all_numbers:
-            try:
-                val = float(n)
-                if val > 0.01:
-                    tps.append(val)
-            except:
-                continue
-    return {"symbol": symbol, "side": side, "entry": entry_price, "tps": tps}
+async def keep_bybit_alive():
+    # An idle pooled connection gets closed; a cheap request keeps it warm for the next signal
+    while True:
+        await asyncio.sleep(BYBIT_KEEPALIVE_INTERVAL)
+        await ping_bybit()
 
 
 # ---------------------------------
 # Telegram Client Setup
 # ---------------------------------
-client = TelegramClient("bybit_auto_trade", TG_API_ID, TG_API_HASH)
+# catch_up=False: never replay missed channel messages (and trade on them) after a reconnect
+client = TelegramClient("bybit_auto_trade", TG_API_ID, TG_API_HASH, catch_up=False)
 
 
 async def start_client():
     try:
         await client.connect()
         if await client.is_user_authorized():
-            print("✅ Connected with existing session file")
+            log.info("✅ Connected with existing session file")
             return
     except Exception as e:
-        print(f"⚠️ Could not use session file: {e}")
+        log.warning("⚠️ Could not use session file: %s", e)
 
     if TG_BOT_TOKEN:
         try:
             await client.start(bot_token=TG_BOT_TOKEN)
-            print("✅ Connected with Bot Token")
+            log.info("✅ Connected with Bot Token")
             return
         except Exception as e:
-            print(f"❌ Bot token authentication failed: {e}")
+            log.error("❌ Bot token authentication failed: %s", e)
             raise
     else:
         try:
             await client.start()
-            print("✅ Connected with interactive login")
+            log.info("✅ Connected with interactive login")
         except EOFError:
-            print("❌ AUTHENTICATION ERROR — no session or token provided.")
+            log.error("❌ AUTHENTICATION ERROR — no session or token provided.")
             raise
 
 
 # ---------------------------------
-# Message Handler
+# Signal Execution
 # ---------------------------------
-@client.on(events.NewMessage(chats=TG_CHANNEL))
-async def handler(event):
-    msg = event.raw_text
-    print(f"\n{'=' * 60}\n📩 New Message:\n{msg}\n{'=' * 60}")
-
-    parsed = parse_signal_message(msg)
-    if not parsed:
-        return
-
+async def execute_signal(parsed):
     symbol = parsed["symbol"]
     side = parsed["side"]
     tps = parsed["tps"]
 
-    print(f"🚀 Signal detected: {symbol} | Side: {side}")
-    balance = get_balance()
+    log.info("🚀 Signal detected: %s | Side: %s", symbol, side)
+
+    # Independent REST calls: run them concurrently. An unexpected error in
+    # one of them must not cancel or hide the others.
+    balance, price, config_res = await asyncio.gather(
+        get_balance(),
+        get_market_price(symbol),
+        ensure_symbol_config(symbol, DEFAULT_LEVERAGE),
+        return_exceptions=True,
+    )
+    if isinstance(config_res, Exception):
+        log.warning("⚠️ Failed to set margin/leverage (continuing): %s", config_res)
+    if isinstance(balance, Exception):
+        log.error("❌ Error fetching balance: %s", balance)
+        balance = Decimal("0")
+    if isinstance(price, Exception):
+        log.error("❌ Error fetching price for %s: %s", symbol, price)
+        price = None
+
     if balance <= 0:
-        print(f"❌ Insufficient balance: {balance}")
+        log.error("❌ Insufficient balance: %s", balance)
         return
-    print(f"💰 Balance: {balance:.2f} USDT")
+    log.info("💰 Balance: %.2f USDT", balance)
 
-    price = get_market_price(symbol)
     if not price:
-        print(f"❌ Could not fetch price for {symbol}")
+        log.error("❌ Could not fetch price for %s", symbol)
         return
-    print(f"📊 Price: {price} USDT")
-
-    set_cross_margin(symbol)
-    set_leverage(symbol, DEFAULT_LEVERAGE)
+    log.info("📊 Price: %s USDT", price)
 
-    qty = calculate_order_qty(balance, TRADE_PERCENT, price)
-    print(f"📈 Quantity: {qty} | Value: {(qty * Decimal(str(price))):.2f} USDT")
+    qty = calculate_order_qty(balance, _TRADE_PERCENT_D, price)
+    log.info("📈 Quantity: %s | Value: %.2f USDT", qty, qty * price)
 
     if qty <= 0:
-        print("❌ Invalid quantity.")
+        log.error("❌ Invalid quantity.")
         return
 
-    print(f"🔄 Placing {side} Market Order...")
-    market_resp = place_market_order(symbol, side, qty)
+    log.info("🔄 Placing %s Market Order...", side)
+    market_resp = await place_market_order(symbol, side, qty)
     if not market_resp:
-        print("❌ Market order failed.")
+        log.error("❌ Market order failed.")
         return
 
     filled_qty = qty
-    print(f"ℹ️ Using filled qty: {filled_qty}")
+    log.info("ℹ️ Using filled qty: %s", filled_qty)
 
     if tps:
-        tp_price = Decimal(str(tps[-1])).quantize(Decimal("1").scaleb(-8), rounding=ROUND_DOWN)
-        print(f"🚀 Placing TP at {tp_price} (100%)")
-        place_reduce_only_tp(symbol, tp_price, side, filled_qty)
+        tp_price = to_decimal(tps[-1]).quantize(_TP_PRICE_QUANT, rounding=ROUND_DOWN)
+        # A TP on the wrong side of the market would close the position at once
+        if (tp_price <= price) if side == "Buy" else (tp_price >= price):
+            log.error("❌ TP %s is on the wrong side of price %s for %s, not placing it.", tp_price, price, side)
+        else:
+            log.info("🚀 Placing TP at %s (100%%)", tp_price)
+            await place_reduce_only_tp(symbol, tp_price, side, filled_qty)
     else:
-        print("ℹ️ No TP found, skipping.")
+        log.info("ℹ️ No TP found, skipping.")
+
 
-    print('=' * 60 + "\n")
+# ---------------------------------
+# Message Handler
+# ---------------------------------
+_symbol_queues = {}  # symbol -> asyncio.Queue of parsed signals
+_symbol_tasks = {}  # symbol -> worker task draining that queue
+
+
+async def _symbol_worker(symbol: str, queue: asyncio.Queue):
+    # Signals for one symbol run in arrival order; other symbols run in parallel.
+    while True:
+        parsed = await queue.get()
+        try:
+            await execute_signal(parsed)
+        except Exception:
+            log.exception("❌ Failed to execute signal for %s", symbol)
+        finally:
+            queue.task_done()
+
+
+@client.on(events.NewMessage(chats=TG_CHANNEL))
+async def handler(event):
+    msg = event.raw_text
+    log.debug("📩 New Message:\n%s", msg)
+
+    parsed = parse_signal_message(msg)
+    if not parsed:
+        return
+
+    # Hand off to the symbol's worker so Telethon's update loop never waits on Bybit
+    symbol = parsed["symbol"]
+    queue = _symbol_queues.get(symbol)
+    if queue is None:
+        queue = _symbol_queues[symbol] = asyncio.Queue()
+        _symbol_tasks[symbol] = asyncio.create_task(_symbol_worker(symbol, queue))
+    queue.put_nowait(parsed)
 
 
 # ---------------------------------
 # Main Function
 # ---------------------------------
 async def main():
+    global _bybit_sem
+    _bybit_sem = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    asyncio.get_running_loop().set_default_executor(_EXECUTOR)
+
     mode = "🧪 TESTNET" if USE_TESTNET else "💰 MAINNET"
-    print(f"\n{'=' * 60}\n🤖 Bybit Auto Trading Bot\nMode: {mode}\nLeverage: {DEFAULT_LEVERAGE}x\nTrade Size: {TRADE_PERCENT * 100}%\nChannel ID: {TG_CHANNEL}\n{'=' * 60}\n")
+    log.info(
+        "🤖 Bybit Auto Trading Bot | Mode: %s | Leverage: %sx | Trade Size: %s%% | Channel ID: %s",
+        mode, DEFAULT_LEVERAGE, TRADE_PERCENT * 100, TG_CHANNEL
+    )
 
+    keepalive = None
     try:
         await start_client()
-        print("👂 Listening for signals...\n")
+        # Pay DNS + TLS setup to Bybit now rather than on the first signal
+        if await ping_bybit():
+            log.info("✅ Bybit connection warmed up")
+        keepalive = asyncio.create_task(keep_bybit_alive())
+        log.info("👂 Listening for signals...")
         await client.run_until_disconnected()
     except KeyboardInterrupt:
-        print("\n⛔ Bot stopped by user.")
+        log.info("⛔ Bot stopped by user.")
     except Exception as e:
-        print(f"\n❌ Fatal error: {e}")
+        log.error("❌ Fatal error: %s", e)
         raise
+    finally:
+        if keepalive:
+            keepalive.cancel()
 
 
 # ---------------------------------
 # Entry Point
 # ---------------------------------
 if __name__ == "__main__":
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
     asyncio.run(main())
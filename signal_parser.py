@@ -0,0 +1,120 @@
+# signal_parser.py
+# Telegram signal parsing, kept free of Telegram/Bybit imports so it can be
+# imported on its own and compiled ahead of time (e.g. `mypyc signal_parser.py`).
+
+import logging
+import re
+from typing import List, Optional, TypedDict
+
+
+class SignalDict(TypedDict):
+    symbol: str
+    side: str
+    entry: Optional[float]
+    tps: List[float]
+
+
+log = logging.getLogger("bot.parser")
+
+# Words that must appear somewhere in a signal (cheap substring pre-check)
+_SIDE_WORDS = ("long", "buy", "short", "sell")
+
+# Signal patterns (compiled once, reused for every message)
+_PRICE_PROFIT_RE = re.compile(r"Price\s*-\s*\d+(\.\d+)?\s*\n.*Profit", re.IGNORECASE)
+# The symbol alternative only starts where an alphanumeric run begins: a ticker
+# found mid-run would also match from the run's start, so this avoids retrying
+# the greedy [A-Z0-9]+ scan at every letter of every word.
+_SIGNAL_RE = re.compile(
+    r"(?P<symbol>(?<![A-Z0-9])#?(?P<base>[A-Z0-9]+)[\-/]?USDT)"
+    r"|\b(?:(?P<buy>long|buy)|(?P<sell>short|sell))\b"
+    r"|(?P<entry>Entry\s*-\s*(?P<entry_price>[0-9]*\.?[0-9]+))"
+    r"|(?P<tp_header>Take-?Profit)",
+    re.IGNORECASE,
+)
+# One TP price per line. In front of it: a keycap index ("1️⃣"), a label
+# ("TP:", "TP1 =", "Target 66000", "Take-Profit 2:") or a bare "1)"/"2." index.
+# The price must end at whitespace, "(" or end of line, so "20x" or "5%" lines
+# are not read as prices; any "(10%)" allocation after it is ignored.
+_TP_LINE_RE = re.compile(
+    r"^[^\w.]*"
+    r"(?:\d\uFE0F?\u20E3[^\w.]*"
+    r"|(?:Take-?\s?Profit|TP|Target)(?:\s*\d{1,2})?(?:\s*[:=\-]\s*|\s+)"
+    r"|\d{1,2}(?:\s*[):\-]|\.(?=\s))\s*)?"
+    r"(?P<price>[0-9]*\.?[0-9]+)(?=\s|\(|$)",
+    re.IGNORECASE,
+)
+# Lines that end the TP block (stop-loss, leverage, entry, ...)
+_NON_TP_LABEL_RE = re.compile(r"\b(?:stop|sl|leverage|entry)\b", re.IGNORECASE)
+
+
+def _is_compact_price_profit(msg: str, msg_l: str) -> bool:
+    # Two substring finds rule out almost every message before the regex runs
+    i = msg_l.find("price")
+    if i < 0 or msg_l.find("profit", i) < 0:
+        return False
+    return _PRICE_PROFIT_RE.search(msg) is not None
+
+
+def parse_signal_message(msg: str) -> Optional[SignalDict]:
+    # Every tradable signal names a USDT pair and a side; skip chatter with
+    # plain substring checks before any regex runs.
+    msg_l = msg.lower()
+    if "usdt" not in msg_l:
+        log.debug("⚠️ No valid symbol found.")
+        return None
+    if not any(w in msg_l for w in _SIDE_WORDS):
+        log.debug("⚠️ No valid signal side found.")
+        return None
+
+    if _is_compact_price_profit(msg, msg_l):
+        log.debug("ℹ️ Ignoring compact price/profit message.")
+        return None
+
+    # One pass over the message; each match is dispatched on its group name.
+    has_buy = has_sell = False
+    symbol: Optional[str] = None
+    entry_price: Optional[float] = None
+    tp_start: Optional[int] = None
+    for m in _SIGNAL_RE.finditer(msg):
+        kind = m.lastgroup
+        if kind == "symbol":
+            if symbol is None:
+                symbol = f"{m.group('base').upper()}USDT"
+        elif kind == "entry":
+            if entry_price is None:
+                entry_price = float(m.group("entry_price"))
+        elif kind == "tp_header":
+            if tp_start is None:
+                tp_start = m.end()
+        elif kind == "buy":
+            has_buy = True
+        else:
+            has_sell = True
+
+    # Any long/buy word wins over short/sell, wherever it appears
+    side = "Buy" if has_buy else "Sell" if has_sell else None
+    if not side:
+        log.debug("⚠️ No valid signal side found.")
+        return None
+
+    if not symbol:
+        log.debug("⚠️ No valid symbol found.")
+        return None
+
+    # TPs are listed one per line after the Take-Profit header. The block ends
+    # at a stop-loss/leverage/entry line, or at the first other line without a
+    # price once TPs have started.
+    tps: List[float] = []
+    if tp_start is not None:
+        for line in msg[tp_start:].splitlines():
+            if _NON_TP_LABEL_RE.search(line):
+                break
+            m = _TP_LINE_RE.match(line)
+            if m:
+                price = float(m.group("price"))
+                if price > 0.01:
+                    tps.append(price)
+            elif tps and line.strip():
+                break
+    return {"symbol": symbol, "side": side, "entry": entry_price, "tps": tps}
+
@@ -0,0 +1,44 @@
+# test_signal_parser.py
+# Run with `python -m pytest test_signal_parser.py`.
+
+import pytest
+
+from signal_parser import parse_signal_message
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("#BTC/USDT Long\nLeverage x20\nEntry - 65000.5\nTake-Profit\n1) 66000 (10%)\n2) 67000 (20%)",
+     [66000.0, 67000.0]),
+    ("LONG ETHUSDT\nEntry - 3000\nTake-Profit\n1) 3100 (10%)\n2) 3200 (20%)", [3100.0, 3200.0]),
+    ("LONG AVAXUSDT\nTake-Profit\n30.5\n31\nLeverage 10x", [30.5, 31.0]),
+    ("LONG BTCUSDT\nTake-Profit\n66000\n68000\nStop-Loss - 64000", [66000.0, 68000.0]),
+    ("SHORT SOLUSDT\nTake-Profit targets:\n\nTP1: 140\nTP2 - 130\n\nSL: 170", [140.0, 130.0]),
+    ("sell #SOL-USDT entry - 150\nTakeProfit: 1. 140\n2. 130.5", [140.0, 130.5]),
+    ("LONG BTCUSDT\nTake-Profit:\nTP: 66000\nTP: 67000", [66000.0, 67000.0]),
+    ("LONG BTCUSDT\nTake-Profit targets\nTarget 66000\nTarget 67000", [66000.0, 67000.0]),
+    ("LONG BTCUSDT\nTake-Profit\nTP1 66000\nTP2 67000", [66000.0, 67000.0]),
+    ("LONG BTCUSDT\nTake-Profit\nTP1 = 66000", [66000.0]),
+    ("LONG BTCUSDT\nTake-Profit\n1️⃣ 66000\n2️⃣ 67000", [66000.0, 67000.0]),
+    ("LONG BTCUSDT\nTake-Profit 1: 66000\nTake-Profit 2: 67000", [66000.0, 67000.0]),
+    ("LONG BTCUSDT\nTake-Profit\n66000\n67000\n20x cross", [66000.0, 67000.0]),
+    ("LONG BTCUSDT\nTake-Profit\n66000\n5% of balance only", [66000.0]),
+])
+def test_take_profits(text, expected):
+    parsed = parse_signal_message(text)
+    assert parsed is not None
+    assert parsed["tps"] == expected
+
+
+@pytest.mark.parametrize("text, side", [
+    ("LONG BTCUSDT", "Buy"),
+    ("SHORT BTCUSDT", "Sell"),
+    ("Short-term LONG BTCUSDT", "Buy"),
+])
+def test_side(text, side):
+    parsed = parse_signal_message(text)
+    assert parsed is not None
+    assert parsed["side"] == side
+
+
+def test_ignores_message_without_side():
+    assert parse_signal_message("BTCUSDT update") is None